@@ -1,19 +1,25 @@
-from http.client import HTTPResponse
+from dataclasses import dataclass
+from functools import lru_cache
+import gzip
+from http.client import HTTPSConnection, RemoteDisconnected
+from io import BytesIO
 import json
 import re
+import select
+import socket
+import threading
 from typing import (
     Any,
     Dict,
     List,
     Literal,
-    NamedTuple,
     Optional,
     Tuple,
+    TypeVar,
     Union,
 )
 from urllib.error import HTTPError
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+from urllib.parse import urlencode, urljoin
 
 from output_json import (
     Curriculum,
@@ -24,33 +30,61 @@ from output_json import (
     DegreePlanJson,
 )
 
-CsvFile = Tuple[str, str]
+CsvFile = Tuple[str, bytes]
 FormData = Dict[str, Union[str, Tuple[str, bytes]]]
+SessionT = TypeVar("SessionT", bound="Session")
 
 
-class UrlOpenReturn(HTTPResponse):
+class Response(BytesIO):
     """
-    HACK: Mimic urllib.request.urlopen's return type. Their docs say they return
-    a `HTTPResponse`, but that doesn't have a `url` attribute, and I don't know
-    how to do intersections in Python typing.
+    The body of a response from Curricular Analytics. It's read in full as soon
+    as it arrives so that the connection is free for the next request.
+
+    `url` is the URL of the page that was eventually returned, after following
+    any redirects. If redirects weren't followed, it's the URL that the response
+    redirects to.
     """
 
     url: str
 
 
-class Blob(bytearray):
-    def write_line(self, line: Union[str, bytes] = "") -> None:
-        if type(line) is str:
-            self.extend(line.encode("utf-8"))
-        elif type(line) is bytes:
-            self.extend(line)
-        self.extend(b"\r\n")
+@lru_cache(maxsize=256)
+def multipart_field(name: str, value: str) -> bytes:
+    """
+    Encodes a text field for a `multipart/form-data` body, including the
+    boundary line before it.
+    """
+    field = f'--{Session.BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+    return field.encode("utf-8")
+
+
+def multipart_file_header(name: str, file_name: str) -> bytes:
+    """
+    Encodes the boundary line and headers that go before a file's contents in a
+    `multipart/form-data` body.
+    """
+    header = f'--{Session.BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{file_name}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+    return header.encode("utf-8")
 
 
-HOST = "https://curricularanalytics.org"
+HOST_NAME = "curricularanalytics.org"
+HOST = f"https://{HOST_NAME}"
+REDIRECTS = {301, 302, 303, 307, 308}
+# Redirect statuses after which the browser fetches the new page with a GET
+GET_REDIRECTS = {301, 302, 303}
+# Same limit as urlopen
+MAX_REDIRECTS = 10
+# Methods that are safe to retry if the connection drops
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
 
+CURRICULUM_LINK = '<a href="/curriculums/'
+CURRICULUM_URL = re.compile(re.escape(HOST) + r"/curriculums/(\d+)")
+DEGREE_PLAN_LINK = re.compile(r'<a href="/degree_plans/(\d+)">([^<]+)</a>')
+CSRF_TOKEN = re.compile(rb'<meta name="csrf-token" content="([\w+=/]+)" />')
 
-class CurriculumEntry(NamedTuple):
+
+@dataclass(slots=True, frozen=True)
+class CurriculumEntry:
     """
     A row in the table listing the user's curricula on Curricular Analytics.
     """
@@ -66,50 +100,162 @@ class CurriculumEntry(NamedTuple):
         Get the ID of the curriculum from its URL in the "Name" column
         (`raw_name`).
         """
-        match = re.match(r'<a href="/curriculums/(\d+)', self.raw_name)
-        if match is None:
+        name = self.raw_name
+        # The link always starts the same way, so just read the digits after it
+        start = end = len(CURRICULUM_LINK)
+        while end < len(name) and name[end].isdigit():
+            end += 1
+        if end == start or not name.startswith(CURRICULUM_LINK):
             raise ValueError(
                 f"The name of the curriculum entry `{self.raw_name}` doesn't seem to be a link."
             )
-        return int(match.group(1))
+        return int(name[start:end])
+
+
+def closed_by_server(sock: socket.socket) -> bool:
+    """
+    Checks whether the server has closed an idle connection. Nothing should
+    arrive on a connection between requests, so anything to read means it was
+    closed (or is about to be).
+    """
+    readable, _, _ = select.select([sock], [], [], 0)
+    return bool(readable)
 
 
 class Session:
     session: str
+    # The Cookie header sent with every request
+    cookie: str
     # Same as CSRF token, as it turns out
     authenticity_token: Optional[str]
+    # Whether to gzip file uploads
+    gzip: bool
 
-    def __init__(self, session: str, authenticity_token: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        session: str,
+        authenticity_token: Optional[str] = None,
+        gzip: bool = False,
+    ) -> None:
         """
         `authenticity_token` is optional because it can get one by itself, but
         you can help save a request by providing your own.
+
+        Set `gzip` to compress the bodies of forms with files, which makes
+        uploading CSV files much smaller. If the server responds to a
+        compressed form with 415 Unsupported Media Type, it's sent again
+        uncompressed, and compression stays off for the rest of the session.
         """
         self.session = session
+        self.cookie = f"_curricularanalytics_session={session}"
         self.authenticity_token = authenticity_token
+        self.gzip = gzip
+        # Each thread keeps its own connection open between requests
+        self._local = threading.local()
+        # Every thread's connection, so `close` can close them all
+        self._connections: List[HTTPSConnection] = []
+        self._connections_lock = threading.Lock()
+
+    def connection(self) -> HTTPSConnection:
+        """
+        Gets this thread's connection to Curricular Analytics. Reusing it avoids
+        a new TCP and TLS handshake for every request.
+        """
+        connection: Optional[HTTPSConnection] = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = HTTPSConnection(HOST_NAME)
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self) -> None:
+        """
+        Closes the connections opened by every thread. The session can still be
+        used afterwards, in which case new connections are opened.
+        """
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+            self._local = threading.local()
+
+    def __enter__(self: SessionT) -> SessionT:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
 
     def request(
         self,
         path: str,
         headers: Dict[str, str] = {},
-        data: Optional[bytes] = None,
+        data: Optional[Union[bytes, List[bytes]]] = None,
         method: str = "GET",
-    ) -> UrlOpenReturn:
-        try:
-            return urlopen(
-                Request(
-                    HOST + path,
-                    headers={
-                        **headers,
-                        "Cookie": f"_curricularanalytics_session={self.session}",
-                    },
-                    data=data,
-                    method=method,
-                )
-            )
-        except HTTPError as error:
+        follow_redirects: bool = True,
+    ) -> Response:
+        """
+        `data` can be a list of byte strings to send one after another, in which
+        case `headers` must include their total Content-Length.
+        """
+        headers = {**headers, "Cookie": self.cookie}
+        # Follow redirects like urlopen did, but over the same connection
+        for _ in range(MAX_REDIRECTS + 1):
+            connection = self.connection()
+            # The server closes connections that sit idle for too long, so
+            # start over on a new one rather than sending into a closed one
+            if connection.sock is not None and closed_by_server(connection.sock):
+                connection.close()
+            reused = connection.sock is not None
+            try:
+                try:
+                    connection.request(method, path, data, headers)
+                    response = connection.getresponse()
+                except (RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # The server can still close the connection just as the
+                    # request is sent. It might have gotten the request first,
+                    # so only try again on a new connection if sending it twice
+                    # is harmless.
+                    if not reused or method not in IDEMPOTENT_METHODS:
+                        raise
+                    connection.close()
+                    connection.request(method, path, data, headers)
+                    response = connection.getresponse()
+                body = response.read()
+            except BaseException:
+                # A connection left partway through a request can't send
+                # another, so the next request on this thread gets a new one
+                connection.close()
+                raise
+            location = response.getheader("Location")
+            if location is None or response.status not in REDIRECTS:
+                break
+            url = urljoin(HOST + path, location)
+            if not url.startswith(HOST + "/"):
+                raise RuntimeError(f"Curricular Analytics redirected to {url}.")
+            path = url[len(HOST) :]
+            if not follow_redirects:
+                break
+            if response.status in GET_REDIRECTS:
+                method = "GET"
+                data = None
+                headers = {
+                    name: value
+                    for name, value in headers.items()
+                    if name.lower() not in ("content-type", "content-length")
+                }
+        else:
+            raise RuntimeError("Curricular Analytics redirected too many times.")
+        if response.status == 401:
             raise RuntimeError(
                 "Curricular Analytics isn't recognizing your `CA_SESSION` environment variable. Could you try getting the session cookie again? See the README for how."
-            ) if error.code == 401 else error
+            )
+        if response.status >= 400:
+            raise HTTPError(
+                HOST + path, response.status, response.reason, response.headers, None
+            )
+        result = Response(body)
+        result.url = HOST + path
+        return result
 
     def get_json(self, path: str) -> Any:
         with self.request(path, {"Accept": "application/json"}) as response:
@@ -118,10 +264,7 @@ class Session:
     def get_auth_token(self) -> str:
         if self.authenticity_token is None:
             with self.request("/degree_plans") as response:
-                match = re.search(
-                    rb'<meta name="csrf-token" content="([\w+=/]+)" />',
-                    response.read(),
-                )
+                match = CSRF_TOKEN.search(response.read())
                 if match is None:
                     raise RuntimeError(
                         "Could not get `authenticity_token` from a form."
@@ -133,12 +276,13 @@ class Session:
             return self.authenticity_token
 
     BOUNDARY = "BOUNDARY"
+    END_LINE = f"--{BOUNDARY}--\r\n".encode("utf-8")
 
     def post_form(
         self,
         path: str,
         form: FormData,
-    ) -> None:
+    ) -> str:
         """
         Submits an HTML form on Curricular Analytics with a POST request. The
         request body is `multipart/form-data`, so it can contain files.
@@ -151,6 +295,9 @@ class Session:
         Handles authentication (includes the `Cookie` header based on the
         `CA_SESSION` environment variable) and identifies and raises errors for when
         the session or form's authenticity token are invalid.
+
+        Returns the URL that the form redirects to. The redirect isn't followed
+        because nothing here needs the page it leads to.
         """
         if all(type(value) is str for value in form.values()):
             request = self.request(
@@ -163,35 +310,60 @@ class Session:
                     }
                 ).encode("utf-8"),
                 "POST",
+                follow_redirects=False,
             )
         else:
-            body: Blob = Blob()
+            # The pieces are sent one after another rather than copied into one
+            # body, since the CSV files can be fairly large
+            parts: List[bytes] = []
             for name, value in form.items():
-                body.write_line(f"--{Session.BOUNDARY}")
                 if type(value) is str:
-                    body.write_line(f'Content-Disposition: form-data; name="{name}"')
-                    body.write_line()
-                    body.write_line(value)
-                elif type(value) is tuple:
+                    parts.append(multipart_field(name, value))
+                else:
                     file_name, content = value
-                    body.write_line(
-                        f'Content-Disposition: form-data; name="{name}"; filename="{file_name}"'
+                    parts.append(multipart_file_header(name, file_name))
+                    parts.append(content)
+                    parts.append(b"\r\n")
+            parts.append(Session.END_LINE)
+            content_type = f"multipart/form-data; boundary={Session.BOUNDARY}"
+            request = None
+            if self.gzip:
+                try:
+                    request = self.request(
+                        path,
+                        {"Content-Type": content_type, "Content-Encoding": "gzip"},
+                        # CSV files compress well even at the fastest level
+                        gzip.compress(b"".join(parts), compresslevel=1),
+                        "POST",
+                        follow_redirects=False,
                     )
-                    body.write_line("Content-Type: application/octet-stream")
-                    body.write_line()
-                    body.write_line(content)
-            body.write_line(f"--{Session.BOUNDARY}--")
-            request = self.request(
-                path,
-                {"Content-Type": f"multipart/form-data; boundary={Session.BOUNDARY}"},
-                body,
-                "POST",
-            )
+                except HTTPError as error:
+                    # 415 Unsupported Media Type means the server rejected the
+                    # compressed body without handling the form, so it's safe to
+                    # send again. Any other error could come from the form
+                    # itself, and sending it again could create a duplicate.
+                    if error.code != 415:
+                        raise
+                    # Other threads only ever see this go from on to off, and
+                    # any compressed form they have in flight gets its own 415
+                    self.gzip = False
+            if request is None:
+                request = self.request(
+                    path,
+                    {
+                        "Content-Type": content_type,
+                        "Content-Length": str(sum(map(len, parts))),
+                    },
+                    parts,
+                    "POST",
+                    follow_redirects=False,
+                )
         with request as response:
             if response.url == HOST + "/users/sign_in":
                 raise RuntimeError(
                     "Curricular Analytics isn't recognizing your `CA_SESSION` environment variable. Could you try getting the session cookie again? See the README for how."
                 )
+            return response.url
 
     def upload_curriculum(
         self,
@@ -200,15 +372,15 @@ class Session:
         year: int,
         data: Union[CsvFile, Curriculum],
         cip_code: str = "",
-    ) -> None:
+    ) -> int:
         """
-        Creates a new curriculum under the given organization.
+        Creates a new curriculum under the given organization and returns its ID.
         """
         form: FormData
         if isinstance(data, tuple):
             file_name, csv = data
             form = {
-                "curriculum[curriculum_file]": (file_name, csv.encode("utf-8")),
+                "curriculum[curriculum_file]": (file_name, csv),
                 "entry_method": "csv_file",
             }
         else:
@@ -216,7 +388,7 @@ class Session:
                 "entry_method": "gui",
                 "curriculum_json": json.dumps(data),
             }
-        self.post_form(
+        url = self.post_form(
             "/curriculums",
             {
                 "authenticity_token": self.get_auth_token(),
@@ -227,6 +399,15 @@ class Session:
                 **form,
             },
         )
+        # Curricular Analytics redirects to the new curriculum's page, so its ID
+        # is in the URL. Asking for the most recent curriculum instead could
+        # pick up one uploaded at the same time by another thread.
+        match = CURRICULUM_URL.fullmatch(url)
+        if match is None:
+            raise RuntimeError(
+                f"Expected Curricular Analytics to redirect to the new curriculum, but it redirected to {url}."
+            )
+        return int(match.group(1))
 
     def upload_degree_plan(
         self, curriculum_id: int, name: str, data: Union[CsvFile, Curriculum]
@@ -238,7 +419,7 @@ class Session:
         if isinstance(data, tuple):
             file_name, csv = data
             form = {
-                "degree_plan[degree_plan_file]": (file_name, csv.encode("utf-8")),
+                "degree_plan[degree_plan_file]": (file_name, csv),
                 "entry_method": "csv_file",
             }
         else:
@@ -268,9 +449,6 @@ class Session:
         Get the user's curricula on Curricular Analytics. This is equivalent to the
         table the user sees at https://curricularanalytics.org/curriculums.
 
-        Used by `upload_major` to get the ID of the most recently created
-        curriculum.
-
         `sort_by` should be the index of the column to sort by, and `direction` is
         whether it should be sorted in ascending (`asc`) or descending (`desc`)
         order. For example, to get the most recent curricula, the creation date is
@@ -304,10 +482,7 @@ class Session:
         with self.request(f"/curriculums/{curriculum_id}") as response:
             return {
                 match.group(2): int(match.group(1))
-                for match in re.finditer(
-                    r'<a href="/degree_plans/(\d+)">([^<]+)</a>',
-                    response.read().decode("utf-8"),
-                )
+                for match in DEGREE_PLAN_LINK.finditer(response.read().decode("utf-8"))
             }
 
     def get_curriculum(self, curriculum_id: int) -> CurriculumHash:
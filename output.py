@@ -9,6 +9,9 @@ Exports:
     variable.
 """
 
+import csv
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from typing import (
     Dict,
     Generator,
@@ -18,16 +21,17 @@ from typing import (
     Optional,
     Set,
     Tuple,
-    Union,
 )
 from college_names import college_names
 from output_json import Curriculum, CurriculumHash, Item, Term, Requisite
 
 from parse import (
     CourseCode,
+    MajorInfo,
     MajorPlans,
     PlannedCourse,
     Prerequisite,
+    Prereqs,
     major_codes,
     prereqs,
 )
@@ -47,13 +51,14 @@ unit_overrides: Dict[str, Tuple[CourseCode, float]] = {
 }
 
 
-class ProcessedCourse(NamedTuple):
+@dataclass(slots=True, frozen=True)
+class ProcessedCourse:
     """
     A record storing parsed course data with errors fixed and exceptions
     applied.
 
-    Produced from an `InputCourse` in `MajorOutput.get_courses` after parsing a
-    course title into a course code.
+    Produced from a `parse.PlannedCourse` in `MajorOutput.get_courses` after
+    parsing a course title into a course code.
     """
 
     course_title: str
@@ -63,48 +68,6 @@ class ProcessedCourse(NamedTuple):
     term: int
 
 
-class InputCourse(NamedTuple):
-    """
-    A record storing the term index that a course is in so the courses can be
-    stored in a flattened list. `term` is 0 for curricula.
-
-    Initially produced from a `parse.PlannedCourse` in
-    `MajorOutput.get_courses`.
-    """
-
-    course: PlannedCourse
-    major_course: bool
-    term: int
-
-    def process(
-        self,
-        code: Optional[CourseCode] = None,
-        course_title: Optional[str] = None,
-        units: Optional[float] = None,
-    ) -> ProcessedCourse:
-        """
-        Apply necessary modifications to the course object, such as changing its
-        course title or units.
-
-        Changing units fixes common errors, such as MATH 11 being labelled as 4
-        units (it is 5 units).
-
-        Changing the course title is helpful when splitting courses like "PHYS
-        1A/1AL" so that there won't be two courses both named "PHYS 1A/1AL."
-        """
-        if course_title is None:
-            course_title = self.course.course_title
-        if units is None:
-            units = self.course.units
-        return ProcessedCourse(
-            clean_course_title(course_title),
-            code or ("", ""),
-            units,
-            self.major_course,
-            self.term,
-        )
-
-
 class OutputCourse(NamedTuple):
     """
     A course output by `OutputCourses`. This contains all the fields necessary
@@ -113,7 +76,6 @@ class OutputCourse(NamedTuple):
     There's a lot of indirections before arriving at this point:
 
     - `parse.PlannedCourse` directly from academic_plans.csv
-    - `InputCourse` keeps track of a course's term index
     - `ProcessedCourse` stores a parsed course code and overridden course titles
       and units
     - `OutputCourse` (this)
@@ -142,9 +104,6 @@ class OutputCourses:
     Why not return a list directly? This intermediate class allows courses to be
     separated based on whether they're a major or college course because degree
     plan CSVs specifically have a separate section for "Additional Courses."
-    Maybe I could've instead output a tuple or something depending on what is
-    needed, but in Python it seems easier to me to loop over a list again and
-    only yield what is necessary rather than partition a list beforehand.
 
     `start_id` is the next unassigned ID that can be assigned to additional
     courses.
@@ -157,10 +116,16 @@ class OutputCourses:
     term_names = ["FA", "WI", "SP", "S1"]
 
     processed_courses: List[ProcessedCourse]
+    major_courses: List[ProcessedCourse]
+    college_courses: List[ProcessedCourse]
     current_id: int
     course_ids: Dict[CourseCode, int]
     duplicate_titles: Dict[str, int]
     claimed_ids: Set[CourseCode]
+    code_indices: Dict[CourseCode, int]
+    title_indices: Dict[str, int]
+    term_indices: Dict[int, int]
+    term_prereqs: Dict[int, Dict[CourseCode, Prereqs]]
     degree_plan: bool
     year: int
 
@@ -175,22 +140,36 @@ class OutputCourses:
         self.processed_courses = processed_courses
         self.degree_plan = degree_plan
         self.year = year
-
-        # 3. Assign course IDs
         self.current_id = start_id
         self.course_ids = course_ids
-        for course in processed_courses:
-            if course.code and course.code not in course_ids:
-                course_ids[course.code] = self.current_id
+        self.major_courses = []
+        self.college_courses = []
+        # Duplicate course titles get numbered so they can start with "GE 1"
+        # and so on
+        self.duplicate_titles = {}
+        # Index of the first course with each code, title, and term, so finding
+        # prerequisites doesn't have to scan the whole plan for every course
+        self.code_indices = {}
+        self.title_indices = {}
+        self.term_indices = {}
+        self.term_prereqs = {}
+
+        # 3. Assign course IDs, all in the same pass
+        for i, course in enumerate(processed_courses):
+            (
+                self.major_courses if course.major_course else self.college_courses
+            ).append(course)
+            code = course.code
+            if code and code not in course_ids:
+                course_ids[code] = self.current_id
                 self.current_id += 1
-
-        # Get duplicate course titles so can start with "GE 1" and so on
-        course_titles = [course.course_title for course in processed_courses]
-        self.duplicate_titles = {
-            title: 0
-            for i, title in enumerate(course_titles)
-            if title in course_titles[0:i]
-        }
+            title = course.course_title
+            if title in self.title_indices:
+                self.duplicate_titles[title] = 0
+            else:
+                self.title_indices[title] = i
+            self.code_indices.setdefault(code, i)
+            self.term_indices.setdefault(course.term, i)
 
         # In case there are duplicate courses, only let a course in course_ids
         # get used once
@@ -201,8 +180,8 @@ class OutputCourses:
         self,
         prereq_ids: List[int],
         coreq_ids: List[int],
-        alternatives: List[Prerequisite],
-        before: Union[int, str],
+        alternatives: Iterable[Prerequisite],
+        before: int,
     ) -> None:
         """
         Helper method to find prerequisites and corequisites for a course.
@@ -219,28 +198,34 @@ class OutputCourses:
         `prereq_ids` and `coreq_ids` are mutable *references* to a list to which
         prerequisite course IDs are added.
 
-        `before` is the term index of the course in question for degree plans,
-        or the title of the course for curricula (which do not have terms, but
-        still have an "order" because they're inherited from Marshall's degree
-        plan---this is a hack).
+        `before` is the index in `self.processed_courses` of the first course
+        that can't be a prerequisite. For degree plans, this is the first course
+        in the same term as the course in question. For curricula (which do not
+        have terms, but still have an "order" because they're inherited from
+        Marshall's degree plan---this is a hack), it's the first course with the
+        same title.
         """
         # Find first processed course whose code is in `alternatives`
-        for course in self.processed_courses:
-            if course.code is None:
-                continue
-            # Assumes processed courses are chronological
-            if isinstance(before, int):
-                if course.term >= before:
-                    return
-            else:
-                if course.course_title == before:
-                    return
-            for code, concurrent in alternatives:
-                if course.code == code:
-                    (coreq_ids if concurrent else prereq_ids).append(
-                        self.course_ids[course.code]
-                    )
-                    return
+        earliest = before
+        match: Optional[Tuple[CourseCode, bool]] = None
+        for code, concurrent in alternatives:
+            index = self.code_indices.get(code)
+            if index is not None and index < earliest:
+                earliest = index
+                match = code, concurrent
+        if match is not None:
+            code, concurrent = match
+            (coreq_ids if concurrent else prereq_ids).append(self.course_ids[code])
+
+    def get_term_prereqs(self, term: int) -> Dict[CourseCode, Prereqs]:
+        """
+        Gets the prerequisites for the term at index `term`.
+        """
+        if term not in self.term_prereqs:
+            self.term_prereqs[term] = prereqs(
+                self.term_names[term % 4] + f"{(self.year + term // 4) % 100:02d}"
+            )
+        return self.term_prereqs[term]
 
     def list_courses(
         self, show_major: Optional[bool] = None
@@ -253,9 +238,16 @@ class OutputCourses:
         requirement. If `show_major` is None or unspecified, all courses will be
         yielded.
         """
-        for course_title, code, units, major_course, term in self.processed_courses:
-            if show_major is not None and major_course != show_major:
-                continue
+        if show_major is None:
+            courses = self.processed_courses
+        elif show_major:
+            courses = self.major_courses
+        else:
+            courses = self.college_courses
+        for course in courses:
+            course_title = course.course_title
+            code = course.code
+            term = course.term
 
             if code in self.claimed_ids:
                 course_id = self.course_ids[code]
@@ -274,19 +266,21 @@ class OutputCourses:
                         prereq_ids,
                         coreq_ids,
                         [Prerequisite(prereq, False)],
-                        course_title,
+                        self.title_indices[course_title],
                     )
             elif code != ("MATH", "18"):
-                reqs = prereqs(
-                    self.term_names[term % 4] + f"{(self.year + term // 4) % 100:02d}"
-                )
+                reqs = self.get_term_prereqs(term)
                 if code in reqs:
                     for alternatives in reqs[code]:
                         self.find_prereq(
                             prereq_ids,
                             coreq_ids,
                             alternatives,
-                            term if self.degree_plan else course_title,
+                            (
+                                self.term_indices[term]
+                                if self.degree_plan
+                                else self.title_indices[course_title]
+                            ),
                         )
 
             if course_title in self.duplicate_titles:
@@ -294,7 +288,7 @@ class OutputCourses:
                 course_title = f"{course_title} {self.duplicate_titles[course_title]}"
 
             yield OutputCourse(
-                course_id, course_title, code, prereq_ids, coreq_ids, units, term
+                course_id, course_title, code, prereq_ids, coreq_ids, course.units, term
             )
 
 
@@ -317,30 +311,51 @@ CURRICULUM_COLS = 10
 DEGREE_PLAN_COLS = 11
 
 
-def rows_to_csv(rows: Iterable[List[str]], columns: int) -> Generator[str, None, None]:
+@lru_cache(maxsize=None)
+def format_units(units: float) -> str:
+    """
+    Formats units without a trailing `.0`.
     """
-    Converts a list of lists of fields into lines of CSV records. Yields a
-    newline-terminated line.
+    return f"{units:g}"  # https://stackoverflow.com/a/2440708
 
-    The return value from `output_plan` should be passed as the `rows` argument.
 
-    `output_plan` always outputs a "Term" column because I'm lazy, so this
-    function can cut off extra columns or adds empty fields as needed to meet
-    the column count.
+def join_ids(ids: List[int]) -> str:
     """
-    for row in rows:
-        yield (
-            ",".join(
-                [
-                    '"' + field.replace('"', '""') + '"'
-                    if any(c in field for c in ',"\r\n')
-                    else field
-                    for field in row
-                ][:columns]
-                + [""] * (columns - len(row))
-            )
-            + "\n"
-        )
+    Joins course IDs with semicolons for the Prerequisites and Corequisites
+    columns. Most courses have at most one requisite, so those skip `join`.
+    """
+    if not ids:
+        return ""
+    if len(ids) == 1:
+        return str(ids[0])
+    return ";".join(map(str, ids))
+
+
+def pad_row(fields: List[str], columns: int) -> List[str]:
+    """
+    Adds empty fields to the end of a row so it has `columns` fields, like how
+    Curricular Analytics' own CSV files pad their metadata rows.
+    """
+    return fields + [""] * (columns - len(fields))
+
+
+class CsvWriter:
+    """
+    Writes CSV records into a growing `bytearray` using the standard library's
+    `csv` module.
+    """
+
+    buffer: bytearray
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.writer = csv.writer(self, lineterminator="\n")
+
+    def write(self, line: str) -> None:
+        """
+        Called by `csv.writer` with each formatted, newline-terminated record.
+        """
+        self.buffer += line.encode("utf-8")
 
 
 class MajorOutput:
@@ -353,7 +368,7 @@ class MajorOutput:
 
     plans: MajorPlans
     course_ids: Dict[CourseCode, int]
-    curriculum: List[PlannedCourse]
+    curriculum: Tuple[PlannedCourse, ...]
     start_id: int
 
     def __init__(self, plans: MajorPlans, start_id: int = 1) -> None:
@@ -363,6 +378,19 @@ class MajorOutput:
         self.start_id = start_id
         self.populate_course_ids()
 
+    @cached_property
+    def major_info(self) -> MajorInfo:
+        return major_codes()[self.plans.major_code]
+
+    @cached_property
+    def degree_type(self) -> str:
+        """
+        The degree type shared by the curriculum and every degree plan.
+        """
+        # NOTE: Currently just gets the last listed award type (bias towards BS over
+        # BA). Will see how to deal with BA vs BS
+        return list(self.major_info.award_types)[-1]
+
     def populate_course_ids(self) -> None:
         """
         Assigns IDs to courses with identifiable course codes (e.g. CSE 11, but
@@ -383,63 +411,116 @@ class MajorOutput:
                         self.course_ids[code] = self.start_id
                         self.start_id += 1
 
+    def plan_courses(
+        self, college: str
+    ) -> Generator[Tuple[PlannedCourse, bool, int], None, None]:
+        """
+        Yields the courses in a college's plan, along with whether they're major
+        courses and their term index. Courses are sorted by title within each
+        quarter.
+        """
+        plan = self.plans.plans[college]
+        quarter_starts = plan.quarter_starts
+        quarter = 0
+        quarter_courses: List[Tuple[int, PlannedCourse]] = []
+        for index, course in enumerate(plan.courses):
+            # Walk `quarter_starts` alongside the courses instead of slicing the
+            # plan into quarters
+            while index >= quarter_starts[quarter + 1]:
+                quarter += 1
+            quarter_courses.append((quarter, course))
+        # The sort is stable, so courses with the same title keep their order
+        quarter_courses.sort(
+            key=lambda pair: (pair[0], pair[1].course_title.strip("^* "))
+        )
+        for quarter, course in quarter_courses:
+            yield (
+                course,
+                course.type == "DEPARTMENT" or course.overlaps_ge,
+                # Move summer sessions to previous quarter, per Carlos' request.
+                # They tend to be GEs says Arturo, so it shouldn't affect
+                # prereqs
+                quarter - (quarter + 1) // 4,
+            )
+
     def get_courses(self, college: Optional[str]) -> OutputCourses:
         """
         Transforms courses from the academic plans into a nicer format for
         output.
         """
-        # 1. Get the courses
-        course_input: Generator[InputCourse, None, None] = (
-            (
-                InputCourse(
-                    course,
-                    course.type == "DEPARTMENT" or course.overlaps_ge,
-                    # Move summer sessions to previous quarter, per Carlos'
-                    # request. They tend to be GEs says Arturo, so it shouldn't
-                    # affect prereqs
-                    i - (i + 1) // 4,
-                )
-                for i, quarter in enumerate(self.plans.plans[college].quarters)
-                for course in sorted(
-                    quarter, key=lambda course: course.course_title.strip("^* ")
-                )
-            )
+        # 1. Get the courses, along with whether they're major courses and
+        # their term index (0 for curricula)
+        course_input: Iterable[Tuple[PlannedCourse, bool, int]] = (
+            self.plan_courses(college)
             if college
-            else (InputCourse(course, True, 0) for course in self.curriculum)
+            else ((course, True, 0) for course in self.curriculum)
         )
 
-        # 2. Split lab courses
+        # 2. Split lab courses. Titles are changed when splitting courses like
+        # "PHYS 1A/1AL" so that there won't be two courses both named "PHYS
+        # 1A/1AL."
         processed_courses: List[ProcessedCourse] = []
-        for input_course in course_input:
-            if input_course.course.course_title in unit_overrides:
-                course_code, units = unit_overrides[input_course.course.course_title]
+        append = processed_courses.append
+        for course, major_course, term in course_input:
+            title = course.course_title
+            if title in unit_overrides:
+                course_code, units = unit_overrides[title]
                 # Override academic plan's math 11 units to 5.0 units per course
                 # catalog. Must exactly match `MATH 11` because `MATH 11 OR PSYC 60`
                 # probably should still be 4.0 units (#20)
-                processed_courses.append(input_course.process(course_code, units=units))
+                append(
+                    ProcessedCourse(
+                        clean_course_title(title),
+                        course_code,
+                        units,
+                        major_course,
+                        term,
+                    )
+                )
                 continue
 
-            parsed = parse_course_name(input_course.course.course_title)
+            parsed = parse_course_name(title)
             if parsed:
                 subject, number, has_lab = parsed
-                code = subject, number
                 if has_lab:
-                    processed_courses.append(
-                        input_course.process(
-                            code, f"{subject} {number}", 3 if has_lab == "L" else 2.5
+                    append(
+                        ProcessedCourse(
+                            f"{subject} {number}",
+                            (subject, number),
+                            3 if has_lab == "L" else 2.5,
+                            major_course,
+                            term,
                         )
                     )
-                    processed_courses.append(
-                        input_course.process(
-                            (subject, number + has_lab),
+                    append(
+                        ProcessedCourse(
                             f"{subject} {number}{has_lab}",
+                            (subject, number + has_lab),
                             2 if has_lab == "L" else 2.5,
+                            major_course,
+                            term,
                         )
                     )
                 else:
-                    processed_courses.append(input_course.process(code))
+                    append(
+                        ProcessedCourse(
+                            clean_course_title(title),
+                            (subject, number),
+                            course.units,
+                            major_course,
+                            term,
+                        )
+                    )
             else:
-                processed_courses.append(input_course.process())
+                append(
+                    ProcessedCourse(
+                        clean_course_title(title),
+                        ("", ""),
+                        course.units,
+                        major_course,
+                        term,
+                    )
+                )
 
         return OutputCourses(
             processed_courses,
@@ -454,30 +535,35 @@ class MajorOutput:
     ) -> Generator[List[str], None, None]:
         """
         Outputs a curriculum or degree plan in Curricular Analytics' CSV format,
-        yielding one row at a time.
+        yielding one row at a time. Every row is already padded to the file's
+        column count, so the rows can be written out as is.
 
         To output a degree plan, specify the college that the degree plan is
         for. If the college isn't specified, then `output_plan` will output the
-        major's curriculum instead.
+        major's curriculum instead. Only degree plans have a "Term" column.
         """
-        major_info = major_codes()[self.plans.major_code]
-        yield ["Curriculum", major_info.name]
+        columns = DEGREE_PLAN_COLS if college else CURRICULUM_COLS
+        major_info = self.major_info
+        yield pad_row(["Curriculum", major_info.name], columns)
         if college:
-            yield ["Degree Plan", f"{major_info.name}/ {college_names[college]}"]
-        yield ["Institution", INSTITUTION]
-        # NOTE: Currently just gets the last listed award type (bias towards BS over
-        # BA). Will see how to deal with BA vs BS
-        yield ["Degree Type", list(major_info.award_types)[-1]]
-        yield ["System Type", SYSTEM_TYPE]
-        yield ["CIP", major_info.cip_code]
+            yield pad_row(
+                ["Degree Plan", f"{major_info.name}/ {college_names[college]}"],
+                columns,
+            )
+        yield pad_row(["Institution", INSTITUTION], columns)
+        yield pad_row(["Degree Type", self.degree_type], columns)
+        yield pad_row(["System Type", SYSTEM_TYPE], columns)
+        yield pad_row(["CIP", major_info.cip_code], columns)
 
         processed = self.get_courses(college)
 
-        for major_course_section in True, False:
-            if not college and not major_course_section:
-                break
-            yield ["Courses" if major_course_section else "Additional Courses"]
-            yield HEADER
+        header = HEADER[:columns]
+        sections = [("Courses", True)]
+        if college:
+            sections.append(("Additional Courses", False))
+        for label, major_course_section in sections:
+            yield pad_row([label], columns)
+            yield header
             for (
                 course_id,
                 course_title,
@@ -487,19 +573,21 @@ class MajorOutput:
                 units,
                 term,
             ) in processed.list_courses(major_course_section):
-                yield [
+                row = [
                     str(course_id),
                     course_title,
                     subject,
                     number,
-                    ";".join(map(str, prereq_ids)),
-                    ";".join(map(str, coreq_ids)),
+                    join_ids(prereq_ids),
+                    join_ids(coreq_ids),
                     "",
-                    f"{units:g}",  # https://stackoverflow.com/a/2440708
+                    format_units(units),
                     "",
                     "",
-                    str(term + 1),
                 ]
+                if college:
+                    row.append(str(term + 1))
+                yield row
 
     def output_json(self, college: Optional[str] = None) -> Curriculum:
         """
@@ -515,9 +603,7 @@ class MajorOutput:
         )
         processed = self.get_courses(college)
         # Put college courses at the bottom of each quarter, consistent with CSV
-        for major_course_section in True, False:
-            if not college and not major_course_section:
-                break
+        for major_course_section in (True, False) if college else (True,):
             for (
                 course_id,
                 course_title,
@@ -548,19 +634,25 @@ class MajorOutput:
                 )
         return curriculum
 
+    def output_bytes(self, college: Optional[str] = None) -> bytes:
+        """
+        Writes the rows from `output_plan` into a single UTF-8 encoded CSV file.
+        This is what gets uploaded to Curricular Analytics, so it skips
+        decoding the CSV into a string.
+        """
+        if college is not None and college not in self.plans.plans:
+            raise KeyError(f"No degree plan available for {college}.")
+        writer = CsvWriter()
+        writer.writer.writerows(self.output_plan(college))
+        return bytes(writer.buffer)
+
     def output(self, college: Optional[str] = None) -> str:
         """
         A helper function that collects the rows from `output_plan` into a
         single newline-terminated string with the entire CSV. You'll probably
         want to use this instead of `output_plan`.
         """
-        if college is not None and college not in self.plans.plans:
-            raise KeyError(f"No degree plan available for {college}.")
-        cols = DEGREE_PLAN_COLS if college else CURRICULUM_COLS
-        csv = ""
-        for line in rows_to_csv(self.output_plan(college), cols):
-            csv += line
-        return csv
+        return self.output_bytes(college).decode("utf-8")
 
     @classmethod
     def from_json(cls, plans: MajorPlans, json: CurriculumHash) -> "MajorOutput":
@@ -587,8 +679,9 @@ if __name__ == "__main__":
     import sys
     from parse import major_plans
 
-    print(
-        MajorOutput(major_plans(2021)[sys.argv[1]]).output(
+    # Write the encoded CSV in one go rather than through print's text layer
+    sys.stdout.buffer.write(
+        MajorOutput(major_plans(2021)[sys.argv[1]]).output_bytes(
             sys.argv[2] if len(sys.argv) > 2 else None
         )
     )
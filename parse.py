@@ -9,84 +9,127 @@ Exports:
 
     `major_plans`, a dictionary mapping from ISIS major codes to `MajorPlans`
     objects, which contains a dictionary mapping college codes to `Plan`s, which
-    have a list of list of `PlannedCourse`s for each quarter.
+    have the `PlannedCourse`s taken in each quarter.
 
     `major_codes`, a dictionary mapping from ISIS major codes to `MajorInfo`
     objects, which contains data from the ISIS major codes spreadsheet.
-"""
 
-from functools import total_ordering
-from typing import Dict, List, Literal, NamedTuple, Optional, Set, Tuple
+    `preload`, which loads all three files in parallel ahead of time.
+"""
 
-__all__ = ["prereqs", "major_plans", "major_codes"]
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from dataclasses import dataclass, field
+import os
+import pickle
+import sys
+import tempfile
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Generator,
+    Iterable,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+__all__ = ["prereqs", "major_plans", "major_codes", "preload"]
 
 CourseCode = Tuple[str, str]
+T = TypeVar("T")
 
 
 def read_csv_from(
-    path: str, not_found_msg: Optional[str] = None, strip: bool = False
-) -> List[List[str]]:
+    path: str,
+    not_found_msg: Optional[str] = None,
+    strip: bool = False,
+    skip_header: bool = False,
+) -> Generator[List[str], None, None]:
     """
-    Reads and parses the file at the given path as a CSV file.
-
-    The CSV parser doesn't validate the CSV, so it's kind of dumb, but I don't
-    think much cleverness is needed for parsing these fairly tame CSV files.
-    There is support for quoted fields and rudimentary support for backslashes
-    (they won't break, but they're currently not interpreted, so `\\"` remains
-    in the field value).
+    Reads and parses the file at the given path as a CSV file using the standard
+    library's `csv` module, which handles quoted fields, including ones with
+    commas and newlines.
 
-    This function returns a list of records (rows), each containing the fields
-    of the record. Quoted fields have their double quotes removed.
+    This function yields records (rows) as they're read, each containing the
+    fields of the record, so the whole file never has to be held in memory.
+    Quoted fields have their double quotes removed.
 
     Since I gitignored the CSV files, I'm using `not_found_msg` to give more
     helpful error messages in case someone running this code hasn't put the
     necessary CSV files in files/ folder.
 
-    Set `strip` to true to remove whitespace padding from record fields.
+    Set `strip` to true to remove whitespace padding from record fields, and
+    `skip_header` to true to leave out the first row.
     """
-    rows: List[List[str]] = []
-
-    def parse_field(field: str) -> str:
-        """
-        Helper function to process a raw field from the CSV file. Removes quotes
-        from quoted fields and strips whitespace if desired.
-        """
-        if len(field) > 0 and field[0] == '"':
-            field = field[1:-1].replace('""', '"')
-        return field.strip() if strip else field
-
     try:
-        with open(path, "r") as file:
-            row_overflow: Optional[Tuple[List[str], str]] = None
-            for line in file.read().splitlines():
-                row: List[str]
-                in_quotes: bool
-                if row_overflow:
-                    row = row_overflow[0]
-                    in_quotes = True
-                else:
-                    row = []
-                    rows.append(row)
-                    in_quotes = False
-                last_index: int = 0
-                for i, char in enumerate(line + ","):
-                    if in_quotes:
-                        if char == '"':
-                            in_quotes = False
-                    else:
-                        if char == '"':
-                            in_quotes = True
-                        elif char == ",":
-                            prefix: str = row_overflow[1] if row_overflow else ""
-                            row_overflow = None
-                            row.append(parse_field(prefix + line[last_index:i]))
-                            last_index = i + 1
-                if in_quotes:
-                    prefix: str = row_overflow[1] if row_overflow else ""
-                    row_overflow = row, prefix + line[last_index:] + "\n"
+        file = open(path, "r", buffering=1 << 20, encoding="utf-8", newline="")
     except FileNotFoundError as e:
         raise e if not_found_msg is None else FileNotFoundError(not_found_msg)
-    return rows
+    with file:
+        reader = csv.reader(file)
+        if skip_header:
+            next(reader, None)
+        if strip:
+            for row in reader:
+                yield [field.strip() for field in row]
+        else:
+            yield from reader
+
+
+CACHE_DIR = "./files/.cache/"
+
+
+def parse_csv_cached(
+    path: str, not_found_msg: str, rows_to_dict: Callable[[Iterable[List[str]]], T]
+) -> T:
+    """
+    Parses the CSV file at `path` (skipping its header) with `rows_to_dict`,
+    reusing a pickled copy of the result from a previous run if there is one.
+
+    The pickle is stored in files/.cache/ along with the CSV file's modification
+    time and size and this file's modification time, so replacing the CSV file
+    or changing how it's parsed makes the cache get rebuilt.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise FileNotFoundError(not_found_msg)
+    key = stat.st_mtime_ns, stat.st_size, os.stat(__file__).st_mtime_ns
+    cache_path = os.path.join(CACHE_DIR, os.path.basename(path) + ".pickle")
+    try:
+        with open(cache_path, "rb") as file:
+            # The key is pickled separately so a stale cache is never unpickled
+            # with classes that may have changed since
+            if pickle.load(file) == key:
+                return pickle.load(file)
+    except Exception:
+        # A missing, truncated or otherwise unreadable cache can fail in all
+        # sorts of ways, and parsing the CSV again fixes all of them
+        pass
+
+    data = rows_to_dict(
+        read_csv_from(path, not_found_msg, strip=True, skip_header=True)
+    )
+
+    # Write to a temporary file first so an interrupted run can't leave a
+    # partial cache behind
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # mkstemp picks a fresh name, so threads writing the same cache don't clash
+    fd, temp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(key, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return data
 
 
 class Prerequisite(NamedTuple):
@@ -94,38 +137,97 @@ class Prerequisite(NamedTuple):
     allow_concurrent: bool
 
 
-@total_ordering
+# A course's requirements, each a tuple of alternatives. These are shared
+# between terms, so they're tuples to keep them from being changed.
+Prereqs = Tuple[Tuple[Prerequisite, ...], ...]
+
+# Fix possible errors in prereqs (#52)
+prereq_fixes: Dict[CourseCode, Prereqs] = {
+    ("NANO", "102"): ((Prerequisite(("CHEM", "6C"), False),),),
+    ("DOC", "2"): ((Prerequisite(("DOC", "1"), False),),),
+}
+
+
 class TermCode(str):
+    """
+    A term code like FA12 that compares chronologically rather than
+    alphabetically.
+    """
+
     quarters = ["WI", "SP", "S1", "S2", "S3", "SU", "FA"]
+    quarter_values = {quarter: i for i, quarter in enumerate(quarters)}
+
+    key: int
+
+    def __new__(cls, term: str) -> "TermCode":
+        self = super().__new__(cls, term)
+        self.key = self.year() * len(TermCode.quarters) + self.quarter_value()
+        return self
 
     def quarter_value(self) -> int:
-        return TermCode.quarters.index(self[0:2])
+        return TermCode.quarter_values[self[0:2]]
 
     def year(self) -> int:
         # Assumes 21st century (all the plans we have are in the 21st century)
         return 2000 + int(self[2:4])
 
+    # str already defines these, so they have to be overridden individually
+    # rather than filled in by `functools.total_ordering`
     def __lt__(self, other: str) -> bool:
         if not isinstance(other, TermCode):
-            raise NotImplemented
-        if self.year() == other.year():
-            return self.quarter_value() < other.quarter_value()
-        else:
-            return self.year() < other.year()
+            return NotImplemented
+        return self.key < other.key
+
+    def __le__(self, other: str) -> bool:
+        if not isinstance(other, TermCode):
+            return NotImplemented
+        return self.key <= other.key
+
+    def __gt__(self, other: str) -> bool:
+        if not isinstance(other, TermCode):
+            return NotImplemented
+        return self.key > other.key
+
+    def __ge__(self, other: str) -> bool:
+        if not isinstance(other, TermCode):
+            return NotImplemented
+        return self.key >= other.key
+
+
+def intern_code(
+    codes: Dict[CourseCode, CourseCode], subject: str, number: str
+) -> CourseCode:
+    """
+    Returns a shared course code tuple for the given subject and number. The
+    same few thousand course codes are repeated across every term, so sharing
+    them (and interning subjects) saves a lot of duplicate tuples and strings.
+    """
+    code = subject, number
+    shared = codes.get(code)
+    if shared is None:
+        shared = codes[code] = sys.intern(subject), number
+    return shared
 
 
 def prereq_rows_to_dict(
-    rows: List[List[str]],
-) -> Dict[TermCode, Dict[CourseCode, List[List[Prerequisite]]]]:
+    rows: Iterable[List[str]],
+) -> Dict[TermCode, Dict[CourseCode, Prereqs]]:
     """
     Converts prerequisite rows from a CSV to a nested dictionary mapping from a
     term code (e.g. FA12) to a course code to its prerequisites.
 
-    The dictionary values are lists of lists. The outer list is a list of
-    requirements, like an AND, while each inner list is a list of possible
+    The dictionary values are tuples of tuples. The outer tuple is a tuple of
+    requirements, like an AND, while each inner tuple is a tuple of possible
     courses to satisfy the requirement, like an OR.
     """
-    terms: Dict[TermCode, Dict[CourseCode, List[List[Prerequisite]]]] = {}
+    parsed: Dict[TermCode, Dict[CourseCode, Prereqs]] = {}
+    codes: Dict[CourseCode, CourseCode] = {}
+    last_term: Optional[str] = None
+    last_course: Optional[CourseCode] = None
+    term_prereqs: Dict[CourseCode, List[List[Prerequisite]]] = {}
+    reqs: List[List[Prerequisite]] = []
+    last_req_id: Optional[str] = None
+    index = -1
     for (
         term,  # Term Code
         _,  # Term ID
@@ -140,53 +242,82 @@ def prereq_rows_to_dict(
         _,  # Prereq Minimum Grade
         allow_concurrent,  # Allow concurrent registration
     ) in rows:
-        term = TermCode(term)
-        if term not in terms:
-            terms[term] = {}
-        course: CourseCode = subject, number
-        prereq = Prerequisite((req_subj, req_num), allow_concurrent == "Y")
-        if course not in terms[term]:
-            terms[term][course] = []
+        # Rows for the same term and course are usually next to each other, so
+        # only look them up again when they change
+        if term != last_term:
+            last_term = term
+            last_course = None
+            term_prereqs = parsed.setdefault(TermCode(term), {})
+        course = intern_code(codes, subject, number)
+        if course is not last_course:
+            last_course = course
+            reqs = term_prereqs.setdefault(course, [])
         if req_id == "":
             continue
-        index = int(req_id) - 1
-        while len(terms[term][course]) <= index:
-            terms[term][course].append([])
+        prereq = Prerequisite(
+            intern_code(codes, req_subj, req_num), allow_concurrent == "Y"
+        )
+        # Alternatives for the same requirement share a sequence ID and are
+        # listed together, so only convert the ID when it changes
+        if req_id != last_req_id:
+            last_req_id = req_id
+            index = int(req_id) - 1
         # Could probably include the allow concurrent registration info here
-        terms[term][course][index].append(prereq)
+        if index == len(reqs):
+            # Usually the first course listed for the next requirement
+            reqs.append([prereq])
+            continue
+        if index > len(reqs):
+            reqs.extend([] for _ in range(index + 1 - len(reqs)))
+        reqs[index].append(prereq)
+
+    # Most courses' prerequisites don't change from term to term, so terms with
+    # identical prerequisites for a course share the same tuple
+    shared: Dict[Prereqs, Prereqs] = {}
+    terms: Dict[TermCode, Dict[CourseCode, Prereqs]] = {}
+    for term, term_reqs in parsed.items():
+        canonical: Dict[CourseCode, Prereqs] = {}
+        for course, reqs in term_reqs.items():
+            key = tuple(tuple(alternatives) for alternatives in reqs)
+            canonical[course] = shared.setdefault(key, key)
+        canonical.update(prereq_fixes)
+        terms[term] = canonical
     return terms
 
 
-_prereqs: Optional[Dict[TermCode, Dict[CourseCode, List[List[Prerequisite]]]]] = None
+_prereqs: Optional[Dict[TermCode, Dict[CourseCode, Prereqs]]] = None
+# The earliest and latest terms in `_prereqs`
+_term_range: Optional[Tuple[TermCode, TermCode]] = None
 
 
-def prereqs(term: str) -> Dict[CourseCode, List[List[Prerequisite]]]:
-    global _prereqs
-    if _prereqs is None:
-        _prereqs = prereq_rows_to_dict(
-            read_csv_from(
-                "./files/prereqs_fa12.csv",
-                "There is no `prereqs_fa12.csv` file in the files/ folder. See the README for where to download it from.",
-                strip=True,
-            )[1:]
+def _load_prereqs() -> Tuple[
+    Dict[TermCode, Dict[CourseCode, Prereqs]],
+    Tuple[TermCode, TermCode],
+]:
+    global _prereqs, _term_range
+    if _prereqs is None or _term_range is None:
+        _prereqs = parse_csv_cached(
+            "./files/prereqs_fa12.csv",
+            "There is no `prereqs_fa12.csv` file in the files/ folder. See the README for where to download it from.",
+            prereq_rows_to_dict,
         )
-        # Fix possible errors in prereqs (#52)
-        for term_prereqs in _prereqs.values():
-            term_prereqs["NANO", "102"] = [[Prerequisite(("CHEM", "6C"), False)]]
-            term_prereqs["DOC", "2"] = [[Prerequisite(("DOC", "1"), False)]]
-    term = TermCode(term)
-    if term not in _prereqs:
-        first_term = min(_prereqs.keys())
-        if term < first_term:
-            term = first_term
-        else:
-            term = max(_prereqs.keys())
-    return _prereqs[term]
+        _term_range = min(_prereqs.keys()), max(_prereqs.keys())
+    return _prereqs, _term_range
+
+
+def prereqs(term: str) -> Dict[CourseCode, Prereqs]:
+    terms, (first_term, last_term) = _load_prereqs()
+    # Term codes hash like plain strings, so this doesn't need a TermCode
+    if term in terms:
+        return terms[term]
+    return terms[first_term if TermCode(term) < first_term else last_term]
 
 
-class PlannedCourse(NamedTuple):
+@dataclass(slots=True, frozen=True)
+class PlannedCourse:
     """
-    Represents a course in an academic plan.
+    Represents a course in an academic plan. There's one of these for every row
+    in academic_plans.csv.
     """
 
     course_title: str
@@ -195,21 +326,51 @@ class PlannedCourse(NamedTuple):
     overlaps_ge: bool
 
 
-class Plan(NamedTuple):
+COURSE_TYPES = frozenset(["COLLEGE", "DEPARTMENT"])
+
+
+@dataclass(slots=True, frozen=True)
+class Plan:
     """
     Represents a college-specific academic plan. Can be used to create degree
     plans for Curricular Analytics.
 
-    `quarters` is always of length 16, with four sequences of
+    The plan's courses are stored in one flat list in chronological order.
+    `quarter_starts` has the index in `courses` where each quarter starts, plus
+    the total number of courses at the end, so quarter `i` is
+    `courses[quarter_starts[i] : quarter_starts[i + 1]]`.
+
+    There are always 16 quarters, with four sequences of
     fall-winter-spring-summer. Yes, some plans do, namely 2014 CLLA DP and 2020
     CG35 SN, which are already known to be oddballs. Plans shouldn't be
     including summer sessions, but some older plans do anyways.
     """
 
-    quarters: List[List[PlannedCourse]]
+    courses: List[PlannedCourse]
+    quarter_starts: Tuple[int, ...]
+
+    @classmethod
+    def from_quarters(cls, quarters: List[List[PlannedCourse]]) -> "Plan":
+        courses: List[PlannedCourse] = []
+        quarter_starts = [0]
+        for quarter in quarters:
+            courses += quarter
+            quarter_starts.append(len(courses))
+        return cls(courses, tuple(quarter_starts))
+
+    @property
+    def quarters(self) -> List[List[PlannedCourse]]:
+        """
+        The courses in each of the 16 quarters.
+        """
+        return [
+            self.courses[start:end]
+            for start, end in zip(self.quarter_starts, self.quarter_starts[1:])
+        ]
 
 
-class MajorPlans(NamedTuple):
+@dataclass(slots=True, frozen=True)
+class MajorPlans:
     """
     Represents a major's set of academic plans. Contains plans for each college.
 
@@ -224,10 +385,14 @@ class MajorPlans(NamedTuple):
     department: str
     major_code: str
     plans: Dict[str, Plan]
+    # Curricula already returned by `curriculum`, by college
+    curricula: Dict[Optional[str], Tuple[PlannedCourse, ...]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
-    def curriculum(self, college: Optional[str] = None) -> List[PlannedCourse]:
+    def curriculum(self, college: Optional[str] = None) -> Tuple[PlannedCourse, ...]:
         """
-        Returns a list of courses based on the specified college's degree plan
+        Returns a tuple of courses based on the specified college's degree plan
         with college-specific courses removed. Can be used to create a
         curriculum for Curricular Analytics.
 
@@ -242,7 +407,13 @@ class MajorPlans(NamedTuple):
         default because it appears to be a generally good college to base
         curricula off of (see #14). If there is no Marshall plan, it will try a
         different college.
+
+        The curriculum is only computed once per college and shared between
+        callers, which is why it's an immutable tuple.
         """
+        if college in self.curricula:
+            return self.curricula[college]
+        requested = college
         if college is None:
             for college_code in MajorPlans.least_weird_colleges:
                 if college_code in self.plans:
@@ -250,20 +421,27 @@ class MajorPlans(NamedTuple):
                     break
             if college is None:
                 raise KeyError("Major has no college plans.")
-        return [
+        curriculum = tuple(
             course
-            for quarter in self.plans[college].quarters
-            for course in quarter
+            for course in self.plans[college].courses
             if course.type == "DEPARTMENT" or course.overlaps_ge
-        ]
+        )
+        self.curricula[requested] = curriculum
+        return curriculum
 
 
-def plan_rows_to_dict(rows: List[List[str]]) -> Dict[int, Dict[str, MajorPlans]]:
+def plan_rows_to_dict(rows: Iterable[List[str]]) -> Dict[int, Dict[str, MajorPlans]]:
     """
     Converts the academic plans CSV rows into a dictionary of major codes to
     `Major` objects.
     """
     years: Dict[int, Dict[str, MajorPlans]] = {}
+    last_plan_key: Optional[Tuple[str, str, str]] = None
+    # Courses are collected by quarter, then flattened once every row is read
+    plan_quarters: Dict[Tuple[int, str, str], List[List[PlannedCourse]]] = {}
+    quarters: List[List[PlannedCourse]] = []
+    unit_values: Dict[str, float] = {}
+    quarter_indices: Dict[Tuple[str, str], int] = {}
     for (
         department,  # Department
         major_code,  # Major
@@ -277,39 +455,64 @@ def plan_rows_to_dict(rows: List[List[str]]) -> Dict[int, Dict[str, MajorPlans]]
         plan_qtr,  # Quarter Taken
         _,  # Term Taken
     ) in rows:
-        year = int(year)
-        if year not in years:
-            years[year] = {}
-        if major_code not in years[year]:
-            years[year][major_code] = MajorPlans(year, department, major_code, {})
-        if college_code not in years[year][major_code].plans:
-            years[year][major_code].plans[college_code] = Plan([[] for _ in range(16)])
-        quarter = (int(plan_yr) - 1) * 4 + int(plan_qtr) - 1
-        if course_type != "COLLEGE" and course_type != "DEPARTMENT":
+        # Each plan's rows are usually next to each other, so only look up the plan
+        # again when it changes
+        plan_key = year, major_code, college_code
+        if plan_key != last_plan_key:
+            last_plan_key = plan_key
+            year = int(year)
+            majors = years.setdefault(year, {})
+            if major_code not in majors:
+                majors[major_code] = MajorPlans(year, department, major_code, {})
+            plan = year, major_code, college_code
+            if plan not in plan_quarters:
+                plan_quarters[plan] = [[] for _ in range(16)]
+            quarters = plan_quarters[plan]
+        # There are only 16 possible year/quarter pairs
+        quarter = quarter_indices.get((plan_yr, plan_qtr))
+        if quarter is None:
+            quarter = quarter_indices[plan_yr, plan_qtr] = (
+                (int(plan_yr) - 1) * 4 + int(plan_qtr) - 1
+            )
+        if course_type not in COURSE_TYPES:
             raise TypeError('Course type is neither "COLLEGE" nor "DEPARTMENT"')
-        years[year][major_code].plans[college_code].quarters[quarter].append(
-            PlannedCourse(course_title, float(units), course_type, overlap == "Y")
+        # Only a handful of distinct unit values appear in the file
+        if units not in unit_values:
+            unit_values[units] = float(units)
+        quarters[quarter].append(
+            # Titles and types repeat across plans, so share one copy of each
+            PlannedCourse(
+                sys.intern(course_title),
+                unit_values[units],
+                sys.intern(course_type),
+                overlap == "Y",
+            )
         )
+    for (year, major_code, college_code), quarters in plan_quarters.items():
+        years[year][major_code].plans[college_code] = Plan.from_quarters(quarters)
     return years
 
 
 _major_plans: Optional[Dict[int, Dict[str, MajorPlans]]] = None
 
 
-def major_plans(year: int) -> Dict[str, MajorPlans]:
+def _load_major_plans() -> Dict[int, Dict[str, MajorPlans]]:
     global _major_plans
     if _major_plans is None:
-        _major_plans = plan_rows_to_dict(
-            read_csv_from(
-                "./files/academic_plans_fa12.csv",
-                "There is no `academic_plans_fa12.csv` file in the files/ folder. See the README for where to download it from.",
-                strip=True,
-            )[1:]
+        _major_plans = parse_csv_cached(
+            "./files/academic_plans_fa12.csv",
+            "There is no `academic_plans_fa12.csv` file in the files/ folder. See the README for where to download it from.",
+            plan_rows_to_dict,
         )
-    return _major_plans[year]
+    return _major_plans
+
+
+def major_plans(year: int) -> Dict[str, MajorPlans]:
+    return _load_major_plans()[year]
 
 
-class MajorInfo(NamedTuple):
+@dataclass(slots=True, frozen=True)
+class MajorInfo:
     """
     Represents information about a major from the ISIS major code list.
 
@@ -322,38 +525,34 @@ class MajorInfo(NamedTuple):
     name: str
     department: str
     cip_code: str
-    award_types: Set[str]
+    award_types: FrozenSet[str]
 
 
-def major_rows_to_dict(rows: List[List[str]]) -> Dict[str, MajorInfo]:
+def major_rows_to_dict(rows: Iterable[List[str]]) -> Dict[str, MajorInfo]:
     majors: Dict[str, MajorInfo] = {}
-    for (
-        _,  # Previous Local Code
-        _,  # UCOP Major Code (CSS)
-        isis_code,  # ISIS Major Code
-        _,  # Major Abbreviation
-        _,  # Major Description
-        title,  # Diploma Title
-        _,  # Start Term
-        _,  # End Term
-        _,  # Student Level
-        department,  # Department
-        award_types,  # Award Type
-        _,  # Program Length (in years)
-        _,  # College
-        cip_code,  # CIP Code
-        _,  # CIP Description
-        _,  # STEM
-        _,  # Self Supporting
-        _,  # Discontinued or Phasing Out
-        _,  # Notes
-    ) in rows:
+    award_type_sets: Dict[str, FrozenSet[str]] = {}
+    # Only 5 of the spreadsheet's 19 columns are used, so they're picked out by
+    # index rather than unpacking every column
+    for row in rows:
+        isis_code = row[2]  # ISIS Major Code
+        title = row[5]  # Diploma Title
+        department = row[9]  # Department
+        award_types = row[10]  # Award Type
+        cip_code = row[13]  # CIP Code
+        # Only a few combinations of award types exist, so majors share them
+        if award_types not in award_type_sets:
+            award_type_sets[award_types] = (
+                frozenset(map(sys.intern, award_types.split(" ")))
+                if award_types
+                else frozenset()
+            )
         majors[isis_code] = MajorInfo(
             isis_code,
             title,
             department,
-            cip_code[0:2] + "." + cip_code[2:],
-            set(award_types.split(" ")) if award_types else set(),
+            # Majors in the same field share a CIP code
+            sys.intern(f"{cip_code[0:2]}.{cip_code[2:]}"),
+            award_type_sets[award_types],
         )
     return majors
 
@@ -364,16 +563,32 @@ _major_codes: Optional[Dict[str, MajorInfo]] = None
 def major_codes():
     global _major_codes
     if _major_codes is None:
-        _major_codes = major_rows_to_dict(
-            read_csv_from(
-                "./files/isis_major_code_list.xlsx - Major Codes.csv",
-                "There is no `isis_major_code_list.xlsx - Major Codes.csv` file in the files/ folder. See the README for where to download it from.",
-                strip=True,
-            )[1:]
+        _major_codes = parse_csv_cached(
+            "./files/isis_major_code_list.xlsx - Major Codes.csv",
+            "There is no `isis_major_code_list.xlsx - Major Codes.csv` file in the files/ folder. See the README for where to download it from.",
+            major_rows_to_dict,
         )
     return _major_codes
 
 
+def preload() -> None:
+    """
+    Loads all three CSV files at once in separate threads rather than one at a
+    time on first use. Only the file reads overlap; parsing and unpickling
+    still hold the GIL, so this mainly helps when the files aren't in the OS
+    cache yet.
+    """
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(_load_prereqs),
+            executor.submit(_load_major_plans),
+            executor.submit(major_codes),
+        ]
+        for future in futures:
+            # Re-raise any errors, such as a missing file
+            future.result()
+
+
 if __name__ == "__main__":
     # print(' '.join(set(major.department for major in major_codes().values())))
     print(
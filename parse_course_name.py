@@ -8,7 +8,9 @@ Exports:
     it can't.
 """
 
+from functools import lru_cache
 import re
+import sys
 from typing import Dict, Literal, Optional, Tuple
 
 __all__ = ["parse_course_name", "clean_course_title"]
@@ -19,8 +21,18 @@ special_cases: Dict[str, ParsedCourseName] = {
     # See #15
     "UD Domain Elective 1 (if MATH 180A not taken)": None,
 }
+# Subjects that look like course codes but aren't real courses
+ignored_subjects = frozenset(["IE", "RR"])
 
+df_prefix = re.compile(r"DF-?\d - ")
+course_code = re.compile(r"\b([A-Z]{2,4}) *(\d+[A-Z]{0,2})(?: *[&/] *\d?[A-Z]([LX]))?")
+ge_combo = re.compile(r"(GE|DEI) */ *(GE|AWP|DEI)")
+ge_suffix = re.compile(r" */ *(GE|AWP|DEI)$", re.I)
+see_note = re.compile(r" *\(\*?(see note|DEI APPROVED|DEI)\*?\)$|^1 ", re.I)
+spaces = re.compile(r" +")
 
+
+@lru_cache(maxsize=None)
 def parse_course_name(
     name: str,
 ) -> ParsedCourseName:
@@ -45,29 +57,36 @@ def parse_course_name(
         return special_cases[name]
     if name.startswith("ADV. CHEM"):
         return None
-    name = re.sub(r"DF-?\d - ", "", name)
-    match = re.search(
-        r"\b([A-Z]{2,4}) *(\d+[A-Z]{0,2})(?: *[&/] *\d?[A-Z]([LX]))?", name
-    )
+    if "DF" in name:
+        name = df_prefix.sub("", name)
+    match = course_code.search(name)
     if match:
         subject, number, has_lab = match.group(1, 2, 3)
-        if subject in ["IE", "RR"]:
+        if subject in ignored_subjects:
             return None
-        return subject, number, has_lab if has_lab == "L" or has_lab == "X" else None
+        # Subjects become dict keys for course IDs and prerequisites
+        return (
+            sys.intern(subject),
+            number,
+            has_lab if has_lab == "L" or has_lab == "X" else None,
+        )
     return None
 
 
+@lru_cache(maxsize=None)
 def clean_course_title(title: str) -> str:
     """
     Cleans up the course title by removing asterisks and (see note)s.
     """
     title = title.strip("^* ¹")
-    match = re.match(r"(GE|DEI) */ *(GE|AWP|DEI)", title)
+    match = ge_combo.match(title)
     if match:
         return "DEI" if match.group(1) == "DEI" or match.group(2) == "DEI" else "GE"
-    title = re.sub(r" */ *(GE|AWP|DEI)$", "", title, flags=re.I)
-    title = re.sub(
-        r" *\(\*?(see note|DEI APPROVED|DEI)\*?\)$|^1 ", "", title, flags=re.I
-    )
-    title = re.sub(r" +", " ", title)
+    # Most titles have nothing to clean up, so skip the regexes that can't match
+    if "/" in title:
+        title = ge_suffix.sub("", title)
+    if "(" in title or title.startswith("1 "):
+        title = see_note.sub("", title)
+    if "  " in title:
+        title = spaces.sub(" ", title)
     return title
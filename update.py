@@ -25,7 +25,8 @@ if __name__ == "__main__":
     college_code = sys.argv[3] if len(sys.argv) >= 4 else None
     year = 2021
 
-    with track_uploaded_curricula(year) as curricula:
+    with track_uploaded_curricula(year) as uploaded:
+        curricula = uploaded.curricula
         if mode == "edit":
             if college_code:
                 output = MajorOutput.from_json(
@@ -49,6 +50,6 @@ if __name__ == "__main__":
                 session.destroy_degree_plan(plan_id)
             else:
                 session.destroy_curriculum(curricula[major_code])
-                del curricula[major_code]
+                uploaded.remove(major_code)
         else:
             raise ValueError(f"Unknown mode '{mode}'")
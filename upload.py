@@ -10,24 +10,64 @@ Exports:
     year, and your initials. It creates and uploads the curriculum and degree
     plans for the major to the organization on Curricular Analytics. Your
     initials are used to sign the CSV file names.
+
+    `upload_many`, which uploads a list of majors several at a time.
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
 import os
-from typing import Dict, Generator, Optional
+import tempfile
+import threading
+from typing import (
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 from dotenv import load_dotenv  # type: ignore
 
-from api import Session
+from api import CsvFile, Session
 from college_names import college_names
 from output import MajorOutput
-from parse import MajorInfo, major_codes, major_plans
+from output_json import Curriculum
+from parse import MajorInfo, major_codes, major_plans, preload
 
 Uploaded = Dict[str, int]
 
 __all__ = ["MajorUploader"]
 
-load_dotenv()
+
+def get_env(name: str) -> str:
+    """
+    Get an environment variable, and if it's not set, then tell the user to set
+    up their `.env` file.
+    """
+    value = os.getenv(name)
+    if value is None:
+        raise EnvironmentError(
+            f"There is no `{name}` environment variable defined. See the README to see how to set up `.env`."
+        )
+    return value
+
+
+def plan_colleges(output: MajorOutput, year: int) -> List[Tuple[str, str]]:
+    """
+    Lists the codes and names of the colleges whose degree plans get uploaded
+    for a major.
+    """
+    return [
+        (college_code, college_name)
+        for college_code, college_name in college_names.items()
+        if college_code in output.plans.plans
+        # Seventh's 2018 plans are messy, so we've been asked to ignore them
+        and not (college_code == "SN" and year < 2020)
+    ]
 
 
 class MajorUploader(Session):
@@ -38,13 +78,56 @@ class MajorUploader(Session):
     the session token yourself.
     """
 
+    # Uploads degree plans for every major, so its threads' connections stay
+    # open from one major to the next
+    plan_executor: ThreadPoolExecutor
+
     def __init__(self) -> None:
-        session = os.getenv("CA_SESSION")
-        if session is None:
-            raise EnvironmentError(
-                f"There is no `CA_SESSION` environment variable defined. See the README to see how to set up `.env`."
+        # Only read `.env` once something actually needs the session tokens
+        load_dotenv()
+        super().__init__(
+            get_env("CA_SESSION"),
+            os.getenv("AUTHENTICITY_TOKEN"),
+            gzip=os.getenv("CA_GZIP") == "1",
+        )
+        self.plan_executor = ThreadPoolExecutor(max_workers=len(college_names))
+
+    def close(self) -> None:
+        """
+        Waits for any degree plans still uploading, then closes every
+        connection.
+        """
+        self.plan_executor.shutdown()
+        # Like the connections, the threads are only started again if needed
+        self.plan_executor = ThreadPoolExecutor(max_workers=len(college_names))
+        super().close()
+
+    def upload_degree_plans(
+        self,
+        curriculum_id: int,
+        major_code: str,
+        plans: Iterable[Tuple[str, Union[CsvFile, Curriculum]]],
+        log: bool = False,
+    ) -> None:
+        """
+        Uploads the given degree plans, each a college name and the degree plan
+        data, to a curriculum. The degree plans don't depend on each other, so
+        they're all uploaded at once instead of waiting on the server for each
+        one in turn.
+        """
+        uploads: Dict[Future[None], str] = {}
+        for college_name, data in plans:
+            upload = self.plan_executor.submit(
+                self.upload_degree_plan,
+                curriculum_id,
+                f"{major_code}/{college_name}",
+                data,
             )
-        super().__init__(session, os.getenv("AUTHENTICITY_TOKEN"))
+            uploads[upload] = college_name
+        for upload in as_completed(uploads):
+            upload.result()
+            if log:
+                print(f"[{major_code}] {uploads[upload]} degree plan uploaded")
 
     def upload_major(
         self,
@@ -66,37 +149,32 @@ class MajorUploader(Session):
         """
         major_code = major.isis_code
         output = MajorOutput(major_plans(year)[major_code])
-        self.upload_curriculum(
+        curriculum_id = self.upload_curriculum(
             organization_id,
             f"{year} {major_code}-{major.name}",
             year,
-            (f"{initials}-Curriculum Plan-{major_code}.csv", output.output()),
+            (f"{initials}-Curriculum Plan-{major_code}.csv", output.output_bytes()),
         )
         if log:
             print(f"[{major_code}] Curriculum uploaded")
-        curriculum_id = self.get_curricula(4, direction="desc")[0].curriculum_id()
-        if log:
             print(
                 f"[{major_code}] Curriculum URL: https://curricularanalytics.org/curriculums/{curriculum_id}"
             )
-        for college_code, college_name in college_names.items():
-            # Seventh's 2018 plans are messy, so we've been asked to ignore them
-            if (
-                college_code not in output.plans.plans
-                or college_code == "SN"
-                and year < 2020
-            ):
-                continue
-            self.upload_degree_plan(
-                curriculum_id,
-                f"{major_code}/{college_name}",
+        self.upload_degree_plans(
+            curriculum_id,
+            major_code,
+            (
                 (
-                    f"{initials}-Degree Plan-{college_name}-{major_code}.csv",
-                    output.output(college_code),
-                ),
-            )
-            if log:
-                print(f"[{major_code}] {college_name} degree plan uploaded")
+                    college_name,
+                    (
+                        f"{initials}-Degree Plan-{college_name}-{major_code}.csv",
+                        output.output_bytes(college_code),
+                    ),
+                )
+                for college_code, college_name in plan_colleges(output, year)
+            ),
+            log,
+        )
         return curriculum_id
 
     def upload_major_json(
@@ -110,7 +188,7 @@ class MajorUploader(Session):
         """
         major_code = major.isis_code
         output = MajorOutput(major_plans(year)[major_code])
-        self.upload_curriculum(
+        curriculum_id = self.upload_curriculum(
             organization_id,
             f"{year} {major_code}-{major.name}",
             year,
@@ -119,25 +197,18 @@ class MajorUploader(Session):
         )
         if log:
             print(f"[{major_code}] Curriculum uploaded")
-        curriculum_id = self.get_curricula(4, direction="desc")[0].curriculum_id()
-        if log:
             print(
                 f"[{major_code}] Curriculum URL: https://curricularanalytics.org/curriculums/{curriculum_id}"
             )
-        for college_code, college_name in college_names.items():
-            if (
-                college_code not in output.plans.plans
-                or college_code == "SN"
-                and year < 2020
-            ):
-                continue
-            self.upload_degree_plan(
-                curriculum_id,
-                f"{major_code}/{college_name}",
-                output.output_json(college_code),
-            )
-            if log:
-                print(f"[{major_code}] {college_name} degree plan uploaded")
+        self.upload_degree_plans(
+            curriculum_id,
+            major_code,
+            (
+                (college_name, output.output_json(college_code))
+                for college_code, college_name in plan_colleges(output, year)
+            ),
+            log,
+        )
         return curriculum_id
 
     def edit_major(
@@ -162,14 +233,8 @@ class MajorUploader(Session):
         if log:
             print(f"[{major_code}] Curriculum edited")
         plan_ids = self.get_degree_plans(curriculum_id)
-        for college_code, college_name in college_names.items():
+        for college_code, college_name in plan_colleges(output, year):
             plan_name = f"{major_code}/{college_name}"
-            if (
-                college_code not in output.plans.plans
-                or college_code == "SN"
-                and year < 2020
-            ):
-                continue
             if plan_name in plan_ids:
                 self.edit_degree_plan(
                     plan_ids[plan_name], output.output_json(college_code)
@@ -184,9 +249,99 @@ class MajorUploader(Session):
                     print(f"[{major_code}] {college_name} degree plan uploaded")
         return curriculum_id
 
+    def upload_many(
+        self,
+        majors: Iterable[MajorInfo],
+        organization_id: int,
+        year: int,
+        initials: str,
+        json: bool = False,
+        concurrency: int = 4,
+        log: bool = False,
+    ) -> Generator[Tuple[str, int], None, None]:
+        """
+        Uploads several majors at a time with `upload_major`, or
+        `upload_major_json` if `json` is true. Yields the major code and
+        curriculum ID of each major as soon as it finishes uploading, which may
+        not be in the order they were given.
+
+        `concurrency` is the number of majors uploaded at once. Their degree
+        plans all share `plan_executor`, so there are never more than
+        `concurrency` connections plus one per college open at a time. If a
+        major fails to upload, the rest still get uploaded and yielded before
+        the error is raised, so that they can be tracked.
+        """
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            uploads: Dict[Future[int], str] = {}
+            for major in majors:
+                upload = (
+                    executor.submit(
+                        self.upload_major_json, major, organization_id, year, log
+                    )
+                    if json
+                    else executor.submit(
+                        self.upload_major, major, organization_id, year, initials, log
+                    )
+                )
+                uploads[upload] = major.isis_code
+            error: Optional[BaseException] = None
+            for upload in as_completed(uploads):
+                try:
+                    curriculum_id = upload.result()
+                except Exception as upload_error:
+                    error = error or upload_error
+                    continue
+                yield uploads[upload], curriculum_id
+        if error is not None:
+            raise error
+
+
+URL_BASE = "https://curricularanalytics.org/curriculums/"
+
+
+class UploadedJournal:
+    """
+    Given by `track_uploaded_curricula`. `curricula` maps from ISIS major codes
+    to the Curricular Analaytics curriculum ID. Changes made through `record`
+    and `remove` are also appended to the end of the YAML file right away, so if
+    the program crashes partway through a batch of uploads, the curricula that
+    did get uploaded are still recorded.
+    """
+
+    curricula: Uploaded
+    file: TextIO
+    lock: threading.Lock
+
+    def __init__(self, curricula: Uploaded, file: TextIO) -> None:
+        self.curricula = curricula
+        self.file = file
+        self.lock = threading.Lock()
+
+    def write(self, line: str) -> None:
+        """
+        Appends a line to the YAML file and waits for it to reach the disk. Must
+        be called while holding `lock`.
+        """
+        self.file.write(line)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def record(self, major_code: str, curriculum_id: int) -> None:
+        with self.lock:
+            self.curricula[major_code] = curriculum_id
+            self.write(f"{major_code}: {URL_BASE}{curriculum_id}\n")
+
+    def remove(self, major_code: str) -> None:
+        with self.lock:
+            del self.curricula[major_code]
+            # An empty entry overrides the ones before it
+            self.write(f"{major_code}:\n")
+
 
 @contextmanager
-def track_uploaded_curricula(year: int) -> Generator[Uploaded, None, None]:
+def track_uploaded_curricula(
+    year: int,
+) -> Generator[UploadedJournal, None, None]:
     """
     Caches the IDs of uploaded curricula on Curricular Analytics in a YAML file
     at `files/uploaded<year>.yml`.
@@ -194,59 +349,74 @@ def track_uploaded_curricula(year: int) -> Generator[Uploaded, None, None]:
     Usage:
 
     ```py
-    with track_uploaded_curricula(year) as curricula:
-        curricula[major_code] = MajorUploader().upload_major_json(
-            major_codes()[major_code], org_id, year
+    with track_uploaded_curricula(year) as uploaded:
+        uploaded.record(
+            major_code,
+            MajorUploader().upload_major_json(major_codes()[major_code], org_id, year),
         )
     ```
 
-    Inside the `with` block, `curricula` is a dictionary mapping from ISIS major
-    codes to the Curricular Analaytics curriculum ID. Curricula not uploaded to
-    Curricular Analytics do not have an entry in the dictionary. At the end of
-    the `with` block, changes to `curricula` are saved back in the YAML file.
+    Inside the `with` block, `uploaded.curricula` is a dictionary mapping from
+    ISIS major codes to the Curricular Analaytics curriculum ID. Curricula not
+    uploaded to Curricular Analytics do not have an entry in the dictionary.
+    Changes made with `record` and `remove` are appended to the YAML file as
+    soon as they're made, and at the end of the `with` block, the file is
+    rewritten with one line per major.
     """
-    URL_BASE = "https://curricularanalytics.org/curriculums/"
     curricula: Uploaded = {}
+    text = ""
     try:
         with open(f"./files/uploaded{year}.yml") as file:
-            for line in file.read().splitlines():
+            text = file.read()
+            for line in text.splitlines():
                 major_code, curriculum_id = line.split(":", maxsplit=1)
                 curriculum_id = curriculum_id.strip()
+                # Later lines were appended after a change, so they win, and an
+                # empty one means the curriculum was removed
                 if curriculum_id.startswith(URL_BASE):
                     curricula[major_code] = int(curriculum_id[len(URL_BASE) :])
+                elif not curriculum_id:
+                    curricula.pop(major_code, None)
     except FileNotFoundError:
         pass
+    journal_file = open(f"./files/uploaded{year}.yml", "a")
+    if text and not text.endswith("\n"):
+        journal_file.write("\n")
+    journal = UploadedJournal(curricula, journal_file)
     try:
-        yield curricula
+        yield journal
     finally:
-        with open(f"./files/uploaded{year}.yml", "w") as file:
-            for major_code in major_plans(year).keys():
-                curriculum_id = curricula.get(major_code)
-                if curriculum_id is None:
-                    file.write(f"{major_code}:\n")
-                else:
-                    file.write(f"{major_code}: {URL_BASE}{curriculum_id}\n")
+        journal_file.close()
+        lines: List[str] = []
+        for major_code in major_plans(year).keys():
+            curriculum_id = curricula.get(major_code)
+            if curriculum_id is None:
+                lines.append(f"{major_code}:\n")
+            else:
+                lines.append(f"{major_code}: {URL_BASE}{curriculum_id}\n")
+        # Write to a temporary file first so an interrupted rewrite can't lose
+        # the journal
+        fd, temp_path = tempfile.mkstemp(dir="./files/", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write("".join(lines))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, f"./files/uploaded{year}.yml")
+        except BaseException:
+            os.remove(temp_path)
+            raise
 
 
 if __name__ == "__main__":
     from argparse import ArgumentParser
 
-    def get_env(name: str) -> str:
-        """
-        Get an environment variable, and if it's not set, then tell the user to set
-        up their `.env` file.
-        """
-        value = os.getenv(name)
-        if value is None:
-            raise EnvironmentError(
-                f"There is no `{name}` environment variable defined. See the README to see how to set up `.env`."
-            )
-        return value
-
     parser = ArgumentParser(
-        description="Automatically upload a major's curriculum and degree plans onto Curricular Analytics."
+        description="Automatically upload majors' curricula and degree plans onto Curricular Analytics."
+    )
+    parser.add_argument(
+        "major_code", nargs="+", help="The ISIS codes of the majors to upload."
     )
-    parser.add_argument("major_code", help="The ISIS code of the major to upload.")
     parser.add_argument(
         "--org",
         type=int,
@@ -268,9 +438,13 @@ if __name__ == "__main__":
         help="Whether to keep track of uploaded curricula in files/uploaded[year].yml. Default: don't keep track",
     )
     args = parser.parse_args()
-    major_code: str = args.major_code
-    if major_code not in major_codes():
-        raise KeyError(f"{major_code} is not a major code that I know of.")
+    load_dotenv()
+    # Every file gets used while uploading, so read them all at once
+    preload()
+    codes: List[str] = args.major_code
+    for major_code in codes:
+        if major_code not in major_codes():
+            raise KeyError(f"{major_code} is not a major code that I know of.")
     org_id: Optional[int] = args.org
     if org_id is None:
         org_id = int(get_env("ORG_ID"))
@@ -280,19 +454,24 @@ if __name__ == "__main__":
     initials: Optional[str] = args.initials
     if initials is None:
         initials = get_env("INITIALS")
-    upload = lambda: (
-        MajorUploader().upload_major_json(
-            major_codes()[major_code], org_id, year, log=True
-        )
-        if args.json
-        else MajorUploader().upload_major(
-            major_codes()[major_code], org_id, year, initials, log=True
+    with MajorUploader() as uploader:
+        uploads = uploader.upload_many(
+            [major_codes()[major_code] for major_code in codes],
+            org_id,
+            year,
+            initials,
+            json=args.json,
+            log=True,
         )
-    )
-    if args.track:
-        with track_uploaded_curricula(year) as curricula:
-            if major_code in curricula:
-                raise KeyError(f"{major_code} already uploaded")
-            curricula[major_code] = upload()
-    else:
-        upload()
+        if args.track:
+            with track_uploaded_curricula(year) as uploaded:
+                for major_code in codes:
+                    if major_code in uploaded.curricula:
+                        raise KeyError(f"{major_code} already uploaded")
+                # Record each curriculum as soon as it's uploaded so one failed
+                # major doesn't lose track of the others
+                for major_code, curriculum_id in uploads:
+                    uploaded.record(major_code, curriculum_id)
+        else:
+            for _ in uploads:
+                pass